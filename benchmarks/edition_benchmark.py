@@ -0,0 +1,208 @@
+# Copyright (c) 2025 Mike Chambers
+# https://github.com/mikechambers/digest
+#
+# MIT License (see LICENSE.md)
+
+# Runs the full digest pipeline against a local stand-in for economist.com
+# and the Ollama API, and reports per stage wall time, request counts, bytes
+# downloaded and peak memory, at multiple edition sizes.
+#
+# Run against a generated edition:
+#
+#   uv run benchmarks/edition_benchmark.py
+#
+# Record a fixture from the page cache of a real run, and benchmark with it:
+#
+#   uv run benchmarks/edition_benchmark.py record --cache ~/tmp/economist/.digest_cache/http --fixture ~/tmp/fixture
+#   uv run benchmarks/edition_benchmark.py --fixture ~/tmp/fixture --scales 1 5 20 --create-summary
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "src"))
+
+import digest
+from standin import StandinServer, generate_fixture, load_fixture, record_fixture
+
+STAGES = [
+    "parse_sections",
+    "load_articles",
+    "build_index",
+    "build_sections",
+    "build_podcast",
+    "build_summary",
+    "render_edition",
+]
+
+# wrap a digest function so the time spent in it is added to timings
+def timed(name, func, timings):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[name] = timings.get(name, 0) + time.perf_counter() - start
+    return wrapper
+
+# run the pipeline once, in this process, and return the results
+def run_once(args):
+    if args.fixture:
+        fixture = load_fixture(args.fixture)
+    else:
+        fixture = generate_fixture([s["slug"] for s in digest.SECTION_INFO])
+
+    server = StandinServer(fixture, scale=args.scale, llm_latency=args.llm_latency)
+    server.start()
+
+    work_dir = tempfile.mkdtemp(prefix="digest-bench-")
+    timings = {}
+
+    try:
+        digest.BASE_URL = server.url
+        digest.WEEKLY_URL = f"{server.url}/weeklyedition/"
+        digest.output_dir = work_dir
+        digest.cache_dir = os.path.join(work_dir, "cache")
+        digest.use_http_cache = not args.no_cache
+        digest.create_summary = args.create_summary
+
+        # copies of an article have the same content, so the summary cache
+        # would hide the cost of generating their summaries
+        digest.summary_cache_size = 0
+        digest.llm_base_url = server.url
+        digest.fetch_workers = args.fetch_workers
+        digest.summary_workers = args.summary_workers
+        digest.fetch_rate = 0
+        digest.verbose = False
+
+        # the fixture's mp3s are on example.com, so probing them would make
+        # requests outside the stand-in server
+        digest.probe_audio = False
+
+        # no need to log in to the stand-in server
+        digest.get_browser_cookies = lambda name: {}
+
+        for stage in STAGES:
+            setattr(digest, stage, timed(stage, getattr(digest, stage), timings))
+
+        start = time.perf_counter()
+        digest.main()
+        total = time.perf_counter() - start
+    finally:
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak_rss *= 1024
+
+    return {
+        "scale": args.scale,
+        "articles": len(fixture["articles"]) * args.scale,
+        "total": total,
+        "stages": timings,
+        "requests": server.requests,
+        "llm_requests": server.llm_requests,
+        "bytes": server.bytes_sent,
+        "peak_rss": peak_rss,
+    }
+
+# run each scale in its own process, so peak memory is measured per run
+def run_scale(args, scale):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = f.name
+
+    command = [
+        sys.executable, os.path.abspath(__file__), "run-one",
+        "--scale", str(scale),
+        "--result", result_path,
+        "--llm-latency", str(args.llm_latency),
+        "--fetch-workers", str(args.fetch_workers),
+        "--summary-workers", str(args.summary_workers),
+    ]
+
+    if args.fixture:
+        command += ["--fixture", args.fixture]
+
+    if args.create_summary:
+        command.append("--create-summary")
+
+    if args.no_cache:
+        command.append("--no-cache")
+
+    try:
+        subprocess.run(command, check=True)
+
+        with open(result_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.remove(result_path)
+
+def print_results(results):
+    header = f"{'scale':>5} {'articles':>8} {'total s':>8} " + " ".join(f"{s:>15}" for s in STAGES)
+    header += f" {'requests':>8} {'llm':>5} {'MB':>7} {'peak RSS MB':>11}"
+    print(header)
+
+    for r in results:
+        stages = " ".join(f"{r['stages'].get(s, 0):>15.3f}" for s in STAGES)
+        print(
+            f"{r['scale']:>5} {r['articles']:>8} {r['total']:>8.2f} {stages} "
+            f"{r['requests']:>8} {r['llm_requests']:>5} {r['bytes'] / (1024 * 1024):>7.1f} "
+            f"{r['peak_rss'] / (1024 * 1024):>11.1f}"
+        )
+
+def add_run_arguments(parser):
+    parser.add_argument("--fixture", help="Recorded edition fixture directory. Defaults to a generated edition")
+    parser.add_argument("--create-summary", action="store_true", help="Generate summaries using the stand-in LLM")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the stand-in LLM takes per request. Default 0.5")
+    parser.add_argument("--fetch-workers", type=int, default=digest.DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--summary-workers", type=int, default=1)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the page cache")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the digest pipeline against a local stand-in server")
+    subparsers = parser.add_subparsers(dest="command")
+
+    add_run_arguments(parser)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 5, 20], help="Edition size multipliers. Default 1 5 20")
+    parser.add_argument("--report", help="Write the results as JSON to this file")
+
+    record = subparsers.add_parser("record", help="Record a fixture from the page cache of a previous run")
+    record.add_argument("--cache", required=True, help="http folder of the digest cache")
+    record.add_argument("--fixture", required=True, help="Directory to write the fixture to")
+
+    run_one = subparsers.add_parser("run-one")
+    add_run_arguments(run_one)
+    run_one.add_argument("--scale", type=int, default=1)
+    run_one.add_argument("--result", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record_fixture(args.cache, args.fixture)
+        print(f"Recorded {count} articles to {args.fixture}")
+        return
+
+    if args.command == "run-one":
+        result = run_once(args)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    results = [run_scale(args, scale) for scale in args.scales]
+    print_results(results)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Copyright (c) 2025 Mike Chambers
+# https://github.com/mikechambers/digest
+#
+# MIT License (see LICENSE.md)
+
+# Compares parse time and peak memory per article page across the available
+# HTML parser backends, with and without targeted parsing.
+#
+# Pages are loaded from saved fixture files. Point --pages at either a
+# directory of saved article .html files, or at the http folder of the digest
+# cache (.digest_cache/http in the output directory) to use the pages saved
+# from a previous run:
+#
+# uv run benchmarks/parse_benchmark.py --pages ~/tmp/economist/.digest_cache/http
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import digest
+
+BACKENDS = ["html.parser", "lxml", "html5lib"]
+
+# load all of the saved pages that contain an article
+def load_pages(pages_dir):
+    pages = []
+
+    for root, dirs, files in os.walk(pages_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+
+            with open(path, "r", encoding="utf-8") as f:
+                if name.endswith(".json"):
+                    text = json.load(f).get("text", "")
+                elif name.endswith(".html"):
+                    text = f.read()
+                else:
+                    continue
+
+            if digest.ARTICLE_ID in text:
+                pages.append(text)
+
+    return pages
+
+def available_backends():
+    backends = []
+
+    for backend in BACKENDS:
+        if backend == "html.parser":
+            backends.append(backend)
+            continue
+
+        try:
+            __import__(backend)
+            backends.append(backend)
+        except ImportError:
+            pass
+
+    return backends
+
+def run(pages, backend, targeted, repeat):
+    times = []
+    peaks = []
+    results = []
+
+    for html in pages:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = digest.parse_article(html, parser=backend, targeted=targeted)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        # measure memory separately, since tracing slows down parsing
+        tracemalloc.start()
+        digest.parse_article(html, parser=backend, targeted=targeted)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        times.append(best)
+        results.append(result)
+
+    return times, peaks, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark article page parsing")
+    parser.add_argument("--pages", required=True, help="Directory of saved article pages")
+    parser.add_argument("--repeat", type=int, default=3, help="Times each page is parsed (best time is used)")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+
+    if not pages:
+        print(f"No article pages found in {args.pages}")
+        sys.exit(1)
+
+    total_kb = sum(len(p) for p in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb / len(pages):.0f} KB average\n")
+
+    print(f"{'backend':<12} {'mode':<9} {'median ms':>10} {'mean ms':>9} {'peak MB':>9} {'matches':>8}")
+
+    reference = None
+    for backend in available_backends():
+        for targeted in (False, True):
+            times, peaks, results = run(pages, backend, targeted, args.repeat)
+
+            # compare the extracted content against the html.parser full parse
+            if reference is None:
+                reference = results
+
+            matches = sum(1 for a, b in zip(results, reference) if a == b)
+
+            print(
+                f"{backend:<12} {'targeted' if targeted else 'full':<9} "
+                f"{statistics.median(times) * 1000:>10.1f} "
+                f"{statistics.mean(times) * 1000:>9.1f} "
+                f"{max(peaks) / (1024 * 1024):>9.1f} "
+                f"{matches:>4}/{len(pages)}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# Copyright (c) 2025 Mike Chambers
+# https://github.com/mikechambers/digest
+#
+# MIT License (see LICENSE.md)
+
+# Local stand-in for economist.com and the Ollama API, used to benchmark the
+# script without credentials or network access.
+#
+# It serves a recorded weekly edition from a fixture directory (or a
+# generated one), and can scale the edition up by serving each article under
+# additional urls.
+#
+# Fixture directory layout:
+#
+#   edition.json    {"date": "YYYY-MM-DD"}
+#   weekly.html     the weekly edition page
+#   articles/       article pages, stored by url path, i.e.
+#                   /leaders/2025/01/02/foo -> articles/leaders/2025/01/02/foo.html
+
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COPY_SUFFIX = "-copy"
+
+# create a fixture directory from the page cache of a previous run
+def record_fixture(http_cache_dir, fixture_dir):
+    weekly = None
+    articles = {}
+
+    for root, dirs, files in os.walk(http_cache_dir):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+
+            with open(os.path.join(root, name), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+
+            path = re.sub(r"^https?://[^/]+", "", entry["url"])
+
+            match = re.match(r"/weeklyedition/(\d{4}-\d{2}-\d{2})", path)
+            if match:
+                # keep the most recent edition if there are several
+                if weekly is None or match.group(1) > weekly[0]:
+                    weekly = (match.group(1), entry["text"])
+            else:
+                articles[path] = entry["text"]
+
+    if weekly is None:
+        raise Exception(f"No weekly edition page found in {http_cache_dir}")
+
+    date, weekly_text = weekly
+    linked = set(re.findall(r'href="(/[^"]+)"', weekly_text))
+
+    os.makedirs(fixture_dir, exist_ok=True)
+
+    with open(os.path.join(fixture_dir, "edition.json"), "w", encoding="utf-8") as f:
+        json.dump({"date": date}, f)
+
+    with open(os.path.join(fixture_dir, "weekly.html"), "w", encoding="utf-8") as f:
+        f.write(weekly_text)
+
+    count = 0
+    for path, text in articles.items():
+        if path not in linked:
+            continue
+
+        file_path = os.path.join(fixture_dir, "articles", path.strip("/") + ".html")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        count += 1
+
+    return count
+
+# generate a synthetic edition, with pages structured like the Economist
+# article pages and padded out to a realistic size
+def generate_fixture(section_slugs, articles_per_section=4, paragraphs=12, padding_kb=150):
+    date = "2025-01-04"
+    pages = {}
+    links = []
+
+    # real pages are mostly embedded page data, plus some navigation markup
+    padding = (
+        "<script id='__NEXT_DATA__' type='application/json'>"
+        + json.dumps({"data": "x" * (padding_kb * 1024)})
+        + "</script><div class='nav'>"
+        + ("<a class='css-nav' href='/section'>Navigation</a>" * 200)
+        + "</div>"
+    )
+
+    for slug in section_slugs:
+        for i in range(articles_per_section):
+            path = f"{slug}2025/01/02/article-{slug.strip('/')}-{i}"
+            links.append(path)
+
+            body = "".join(
+                f'<p data-component="paragraph">Paragraph {p} of {path}, with <i>some</i> '
+                f'<a href="/x">inline</a> <span>markup</span> and enough words to be realistic.</p>'
+                for p in range(paragraphs)
+            )
+
+            pages[path] = f"""<html><head><title>{path}</title></head><body>{padding}
+<section class="css-1ugvd2u e18wk22u0"><figure><img src="https://example.com/img/{i}.jpg"></figure></section>
+<h1 class="css-1tik00t e1r8fcie0">Article {i} in {slug}</h1>
+<h2 class="css-1n9j4ny eg03uz0">The subtitle of the article</h2>
+<span class="css-rjcumh e1vi1cqp0"><!-- --> Section blurb</span>
+<audio src="https://example.com/audio/{i}.mp3"></audio>
+<article id="new-article-template">{body}<h2>A heading</h2>
+<figure><img src="https://example.com/img/{i}-2.jpg"></figure>{body}<aside>aside</aside></article>
+{padding}</body></html>"""
+
+    weekly = "<html><body>" + "".join(f'<a href="{p}">{p}</a>' for p in links) + "</body></html>"
+
+    return {"date": date, "weekly": weekly, "articles": pages}
+
+def load_fixture(fixture_dir):
+    with open(os.path.join(fixture_dir, "edition.json"), "r", encoding="utf-8") as f:
+        date = json.load(f)["date"]
+
+    with open(os.path.join(fixture_dir, "weekly.html"), "r", encoding="utf-8") as f:
+        weekly = f.read()
+
+    articles = {}
+    articles_dir = os.path.join(fixture_dir, "articles")
+    for root, dirs, files in os.walk(articles_dir):
+        for name in files:
+            file_path = os.path.join(root, name)
+            path = "/" + os.path.relpath(file_path, articles_dir)[:-len(".html")].replace(os.sep, "/")
+
+            with open(file_path, "r", encoding="utf-8") as f:
+                articles[path] = f.read()
+
+    return {"date": date, "weekly": weekly, "articles": articles}
+
+class StandinServer:
+
+    def __init__(self, fixture, scale=1, llm_latency=0.0):
+        self.fixture = fixture
+        self.scale = scale
+        self.llm_latency = llm_latency
+        self.requests = 0
+        self.llm_requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+        # serve each article under additional urls to scale up the edition
+        weekly = fixture["weekly"]
+        copies = "".join(
+            f'<a href="{path}{COPY_SUFFIX}{n}"></a>'
+            for path in fixture["articles"]
+            for n in range(1, scale)
+        )
+        self.weekly = weekly.replace("</body>", copies + "</body>") if "</body>" in weekly else weekly + copies
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+
+                if path.rstrip("/") == "/weeklyedition":
+                    standin.count(0)
+                    self.send_response(302)
+                    self.send_header("Location", f"/weeklyedition/{standin.fixture['date']}")
+                    self.end_headers()
+                    return
+
+                if path.startswith("/weeklyedition/"):
+                    body = standin.weekly
+                else:
+                    body = standin.fixture["articles"].get(re.sub(f"{COPY_SUFFIX}\\d+$", "", path))
+
+                if body is None:
+                    standin.count(0)
+                    self.send_error(404)
+                    return
+
+                self.send_body(body.encode("utf-8"), "text/html; charset=utf-8")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+
+                time.sleep(standin.llm_latency)
+
+                content = json.dumps({
+                    "summary": ["First point.", "Second point.", "Third point."],
+                    "relevance": "Why the article matters."
+                })
+
+                data = {
+                    "model": "standin",
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "eval_count": 60,
+                    "eval_duration": int(max(standin.llm_latency, 0.001) * 1e9),
+                }
+
+                self.send_body(json.dumps(data).encode("utf-8"), "application/json", llm=True)
+
+            def send_body(self, body, content_type, llm=False):
+                standin.count(len(body), llm)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def count(self, size, llm=False):
+        with self.lock:
+            if llm:
+                self.llm_requests += 1
+            else:
+                self.requests += 1
+                self.bytes_sent += size
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
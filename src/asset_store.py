@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+from atomic_file import AtomicFile
+
+# Local store for images and audio files referenced by articles, shared
+# between editions. Files are downloaded with streaming writes (so large
+# files are never held in memory), stored by the hash of their content (so
+# the same file linked from different urls is only stored once), and
+# interrupted downloads are resumed using HTTP Range requests.
+class AssetStore:
+    INDEX_FILE = "index.json"
+    PARTIAL_DIR = "partial"
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = 60
+
+    def __init__(self, root, session=None):
+        self.root = root
+        self.session = session
+        self.lock = threading.Lock()
+        self.index_path = os.path.join(root, self.INDEX_FILE)
+        self.partial_dir = os.path.join(root, self.PARTIAL_DIR)
+
+        os.makedirs(self.partial_dir, exist_ok=True)
+
+        # url to path (relative to the root) of the stored file
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {}
+
+    # returns the path of the stored file for the url (relative to the root)
+    # or None if it hasn't been downloaded
+    def lookup(self, url):
+        with self.lock:
+            path = self.index.get(url)
+
+        if path and os.path.exists(os.path.join(self.root, path)):
+            return path
+
+        return None
+
+    # download the url into the store if it isn't already there, returning
+    # the relative path of the stored file
+    def download(self, url):
+        path = self.lookup(url)
+        if path or self.session is None:
+            return path
+
+        url_hash = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        partial_path = os.path.join(self.partial_dir, url_hash)
+
+        # continue from where a previous download stopped
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+
+            if response.status_code == 416:
+                # the partial file is already complete
+                pass
+            elif response.status_code == 206:
+                self.write_chunks(response, partial_path, "ab")
+            elif response.status_code == 200:
+                # server ignored the range, so start over
+                self.write_chunks(response, partial_path, "wb")
+            else:
+                raise Exception(f"Non 200 Status code returned ({response.status_code}) : {url}")
+
+        content_hash = self.hash_file(partial_path)
+        path = os.path.join(content_hash[:2], content_hash + self.extension(url))
+        full_path = os.path.join(self.root, path)
+
+        if os.path.exists(full_path):
+            # same content was already downloaded from another url
+            os.remove(partial_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(partial_path, full_path)
+
+        with self.lock:
+            self.index[url] = path
+
+        return path
+
+    def write_chunks(self, response, path, mode):
+        with open(path, mode) as f:
+            for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                f.write(chunk)
+
+    # download the urls concurrently. Returns a dict of url to stored path for
+    # the urls that were downloaded, and a dict of url to error for the rest
+    def mirror(self, urls, workers=4):
+        paths = {}
+        errors = {}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.download, url): url for url in set(urls)}
+
+            for future in as_completed(futures):
+                url = futures[future]
+
+                try:
+                    path = future.result()
+                except Exception as e:
+                    errors[url] = e
+                    continue
+
+                if path:
+                    paths[url] = path
+
+        self.save()
+
+        return paths, errors
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.index)
+
+        with AtomicFile(self.index_path, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    @classmethod
+    def hash_file(cls, path):
+        h = hashlib.sha256()
+
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(cls.CHUNK_SIZE), b""):
+                h.update(chunk)
+
+        return h.hexdigest()
+
+    @staticmethod
+    def extension(url):
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+
+        if not ext or len(ext) > 5:
+            return ".bin"
+
+        return ext
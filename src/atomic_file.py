@@ -0,0 +1,60 @@
+import os
+import secrets
+
+# Writes a file atomically. The data is written to a temporary file in the
+# same directory, which is renamed into place once it is complete, so
+# readers never see a partially written file, and an interrupted run never
+# leaves one behind.
+#
+# The temporary file is created with the permissions open() would give the
+# file (mkstemp only allows the owner to read it).
+#
+#   with AtomicFile(path, "w", encoding="utf-8") as f:
+#       f.write(text)
+#
+# or, when the file is written over time, call commit() or abort() on the
+# AtomicFile once done with its file.
+class AtomicFile:
+    SUFFIX = ".tmp"
+
+    def __init__(self, path, mode="wb", encoding=None):
+        self.path = path
+        dir_path = os.path.dirname(path) or "."
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+        while True:
+            self.tmp_path = os.path.join(dir_path, f".{os.path.basename(path)}.{secrets.token_hex(6)}{self.SUFFIX}")
+
+            try:
+                fd = os.open(self.tmp_path, flags, 0o666)
+                break
+            except FileExistsError:
+                continue
+
+        self.file = os.fdopen(fd, mode, encoding=encoding)
+
+    def __enter__(self):
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.abort()
+        else:
+            self.commit()
+
+    # move the file into place
+    def commit(self):
+        try:
+            self.file.close()
+            os.replace(self.tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self.file.close()
+
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
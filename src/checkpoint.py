@@ -0,0 +1,49 @@
+import json
+import os
+import threading
+
+# Append only log of articles as they are retrieved and summarized, so a run
+# that fails part way through can be resumed without losing completed work.
+# Each line is a JSON copy of an article, and later lines for the same url
+# replace earlier ones.
+class Checkpoint:
+    FILE_NAME = "checkpoint.jsonl"
+
+    def __init__(self, edition_dir):
+        self.path = os.path.join(edition_dir, self.FILE_NAME)
+        self.lock = threading.Lock()
+
+    # returns a dict of url to article for all of the checkpointed articles
+    def load(self):
+        articles = {}
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        article = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line may be incomplete if the run was killed
+                        # while writing it
+                        continue
+
+                    articles[article["url"]] = article
+        except FileNotFoundError:
+            pass
+
+        return articles
+
+    # called from both the fetch and summary threads
+    def record(self, article):
+        line = json.dumps(article)
+
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+
+    # remove the checkpoint once the edition has been completely built
+    def clear(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,81 @@
+import math
+import re
+
+# Splits article text into pieces that fit in the LLM's context window.
+#
+# Token counts are estimated from the length of the text rather than by
+# running the model's tokenizer (which Ollama doesn't expose). English prose
+# averages around 4 characters per token for the llama tokenizers, so this
+# errs on the side of overestimating.
+CHARS_PER_TOKEN = 3.5
+
+SENTENCE_REGEX = re.compile(r'(?<=[.!?])\s+')
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+# split the paragraphs into chunks of roughly equal size, each no larger than
+# max_tokens. Paragraphs are kept together where possible, and only split
+# (between sentences) when a single paragraph is too large for a chunk.
+# Returns a list of chunks, each a list of paragraphs
+def split_into_chunks(paragraphs, max_tokens):
+    pieces = []
+    for p in paragraphs:
+        pieces.extend(split_paragraph(p, max_tokens))
+
+    total = sum(estimate_tokens(p) for p in pieces)
+
+    # aim for evenly sized chunks, rather than filling all but the last
+    count = max(1, math.ceil(total / max_tokens))
+    target = min(max_tokens, math.ceil(total / count))
+
+    chunks = []
+    current = []
+    size = 0
+
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+
+        if current and (size + tokens > max_tokens or size >= target):
+            chunks.append(current)
+            current = []
+            size = 0
+
+        current.append(piece)
+        size += tokens
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+# split a paragraph that is too large for a chunk into sentences, and if a
+# sentence is still too large, into fixed size pieces
+def split_paragraph(paragraph, max_tokens):
+    if estimate_tokens(paragraph) <= max_tokens:
+        return [paragraph]
+
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+
+    pieces = []
+    current = ""
+
+    for sentence in SENTENCE_REGEX.split(paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        pieces.append(current)
+
+    return pieces
@@ -0,0 +1,207 @@
+import os
+import shutil
+import time
+import zipfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from atomic_file import AtomicFile
+
+# Writes an EPUB 3 book. Files are streamed into the archive as they are
+# added (text from an iterable of strings, such as a Jinja template's
+# generate(), and other files copied from disk), so the book's contents
+# are never held in memory or written to disk individually.
+#
+# Chapters are added in reading order. The package document and the table
+# of contents are written when the book is closed. The book is written to a
+# temporary file and renamed into place, so an interrupted build never
+# leaves a partial book.
+#
+#   with EpubWriter(path, title, identifier) as epub:
+#       epub.add_text("style.css", [css])
+#       epub.add_text("a.xhtml", chunks, title="Title", section="Section")
+class EpubWriter:
+    CONTENT_DIR = "OEBPS"
+    NAV_FILE = "nav.xhtml"
+    PACKAGE_FILE = "content.opf"
+
+    MEDIA_TYPES = {
+        ".xhtml": "application/xhtml+xml",
+        ".css": "text/css",
+        ".jpg": "image/jpeg",
+        ".jpeg": "image/jpeg",
+        ".png": "image/png",
+        ".gif": "image/gif",
+        ".webp": "image/webp",
+        ".svg": "image/svg+xml",
+    }
+
+    # images are already compressed, so they are stored as they are
+    COMPRESSED = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
+
+    def __init__(self, path, title, identifier, language="en"):
+        self.path = path
+        self.title = title
+        self.identifier = identifier
+        self.language = language
+        self.items = []
+        self.chapters = []
+        self.names = set()
+        self.date_time = time.localtime()[:6]
+
+        self.file = AtomicFile(path)
+        self.zip = zipfile.ZipFile(self.file.file, "w", zipfile.ZIP_DEFLATED)
+
+        # the mimetype must be the first file, and not compressed
+        self._write("mimetype", [b"application/epub+zip"], zipfile.ZIP_STORED)
+
+        self._write("META-INF/container.xml", [(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+            '  <rootfiles>\n'
+            f'    <rootfile full-path="{self.CONTENT_DIR}/{self.PACKAGE_FILE}" media-type="application/oebps-package+xml"/>\n'
+            '  </rootfiles>\n'
+            '</container>\n'
+        ).encode("utf-8")])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def has(self, name):
+        return name in self.names
+
+    # add a text file from a string or an iterable of strings. name is
+    # relative to the content directory. Files with a title are chapters,
+    # and are added to the reading order and the table of contents, grouped
+    # by section. properties are added to the file's manifest item (such as
+    # remote-resources, for chapters that link to images online)
+    def add_text(self, name, data, title=None, section=None, properties=None):
+        if isinstance(data, str):
+            data = (data,)
+
+        self._add(name, properties)
+        self._write(self._full_name(name), (chunk.encode("utf-8") for chunk in data))
+
+        if title is not None:
+            self.chapters.append({"name": name, "title": title, "section": section})
+
+    # copy a file from disk into the book
+    def add_file(self, name, path):
+        self._add(name)
+
+        ext = os.path.splitext(name)[1].lower()
+        compress_type = zipfile.ZIP_STORED if ext in self.COMPRESSED else zipfile.ZIP_DEFLATED
+
+        info = self._info(self._full_name(name), compress_type)
+        with open(path, "rb") as src, self.zip.open(info, "w") as dest:
+            shutil.copyfileobj(src, dest)
+
+    # write the table of contents and package document, and move the book
+    # into place
+    def close(self):
+        try:
+            self._write(self._full_name(self.NAV_FILE), [self._nav().encode("utf-8")])
+            self._write(self._full_name(self.PACKAGE_FILE), [self._package().encode("utf-8")])
+            self.zip.close()
+            self.file.commit()
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self.zip.close()
+        self.file.abort()
+
+    def _add(self, name, properties=None):
+        if name in self.names:
+            raise ValueError(f"File already added to book : {name}")
+
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in self.MEDIA_TYPES:
+            raise ValueError(f"Unsupported file type for book : {name}")
+
+        self.names.add(name)
+        self.items.append({
+            "id": f"item{len(self.items) + 1}",
+            "name": name,
+            "media_type": self.MEDIA_TYPES[ext],
+            "properties": properties
+        })
+
+    def _full_name(self, name):
+        return f"{self.CONTENT_DIR}/{name}"
+
+    def _info(self, name, compress_type):
+        info = zipfile.ZipInfo(name, date_time=self.date_time)
+        info.compress_type = compress_type
+        return info
+
+    def _write(self, name, chunks, compress_type=zipfile.ZIP_DEFLATED):
+        with self.zip.open(self._info(name, compress_type), "w") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    def _nav(self):
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<!DOCTYPE html>',
+            f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{self.language}" xml:lang="{self.language}">',
+            f'<head><meta charset="UTF-8"/><title>{escape(self.title)}</title></head>',
+            '<body>',
+            '<nav epub:type="toc" id="toc">',
+            f'<h1>{escape(self.title)}</h1>',
+            '<ol>',
+        ]
+
+        section = None
+        for chapter in self.chapters:
+            if chapter["section"] != section:
+                if section is not None:
+                    lines.append('</ol></li>')
+
+                section = chapter["section"]
+                lines.append(f'<li><span>{escape(section or "")}</span><ol>')
+
+            lines.append(f'<li><a href={quoteattr(chapter["name"])}>{escape(chapter["title"])}</a></li>')
+
+        if section is not None:
+            lines.append('</ol></li>')
+
+        lines += ['</ol>', '</nav>', '</body>', '</html>', '']
+
+        return "\n".join(lines)
+
+    def _package(self):
+        modified = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        ids = {item["name"]: item["id"] for item in self.items}
+
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">',
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">',
+            f'<dc:identifier id="book-id">{escape(self.identifier)}</dc:identifier>',
+            f'<dc:title>{escape(self.title)}</dc:title>',
+            f'<dc:language>{escape(self.language)}</dc:language>',
+            f'<meta property="dcterms:modified">{modified}</meta>',
+            '</metadata>',
+            '<manifest>',
+            f'<item id="nav" href="{self.NAV_FILE}" media-type="application/xhtml+xml" properties="nav"/>',
+        ]
+
+        for item in self.items:
+            properties = f' properties="{item["properties"]}"' if item["properties"] else ""
+            lines.append(
+                f'<item id="{item["id"]}" href={quoteattr(item["name"])} media-type="{item["media_type"]}"{properties}/>'
+            )
+
+        lines += ['</manifest>', '<spine>']
+        lines += [f'<itemref idref="{ids[c["name"]]}"/>' for c in self.chapters]
+        lines += ['</spine>', '</package>', '']
+
+        return "\n".join(lines)
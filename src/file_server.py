@@ -0,0 +1,444 @@
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urljoin, urlsplit
+
+from atomic_file import AtomicFile
+
+# brotli is optional. Without it, files are only compressed with gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Serves the output directory (all of the editions) over HTTP, so the
+# editions can be read, and the podcasts subscribed to, from other devices.
+#
+# Files are sent with sendfile (so they are copied to the socket by the
+# kernel, and never read into memory), support Range requests (so podcast
+# apps can seek and resume mp3 downloads), and have strong ETags and
+# Last-Modified headers so clients only download files that have changed.
+#
+# Text files are sent compressed (brotli or gzip) to clients that accept
+# it. A precompressed copy next to the file (such as index.html.gz) is used
+# if there is one, otherwise a copy is compressed the first time the file is
+# requested and kept in cache_dir.
+#
+# The links in podcast.xml are relative, which podcast apps don't support,
+# so they are made absolute using the address the feed was requested from
+# (or base_url, if set).
+class FileServer:
+    INDEX_FILE = "index.html"
+    PODCAST_FILE = "podcast.xml"
+    CHUNK_SIZE = 64 * 1024
+
+    # files in these directories are named by the hash of their content,
+    # so they never change
+    IMMUTABLE_DIRS = ("assets/",)
+
+    COMPRESSIBLE = {".html", ".xhtml", ".xml", ".css", ".js", ".json", ".md", ".svg", ".txt"}
+    MIN_COMPRESS_SIZE = 1024
+
+    CONTENT_TYPES = {
+        ".md": "text/markdown",
+        ".mp3": "audio/mpeg",
+        ".webp": "image/webp",
+        ".avif": "image/avif",
+        ".epub": "application/epub+zip",
+        ".js": "text/javascript",
+        ".xhtml": "application/xhtml+xml",
+    }
+
+    # seconds an idle keep-alive connection is kept open
+    TIMEOUT = 60
+
+    def __init__(self, root, host="127.0.0.1", port=8000, base_url=None, cache_dir=None, verbose=False):
+        self.root = os.path.realpath(root)
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+
+        # (extension, content encoding), in order of preference
+        self.encodings = [(".gz", "gzip")]
+        if brotli:
+            self.encodings.insert(0, (".br", "br"))
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.server = _Server((host, port), self._handler())
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+    # the file for a url path, or None if it doesn't exist or can't be
+    # served. Hidden files and directories (such as the cache) are not served
+    def resolve(self, url_path):
+        rel_path = posixpath.normpath(unquote(url_path)).lstrip("/")
+
+        if rel_path == ".":
+            rel_path = ""
+
+        if any(part.startswith(".") for part in rel_path.split("/") if part):
+            return None, None
+
+        path = os.path.realpath(os.path.join(self.root, rel_path))
+
+        if path != self.root and not path.startswith(self.root + os.sep):
+            return None, None
+
+        return path, rel_path
+
+    def content_type(self, path):
+        ext = os.path.splitext(path)[1].lower()
+        content_type = self.CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        if content_type.startswith("text/") or ext in self.COMPRESSIBLE:
+            content_type += "; charset=utf-8"
+
+        return content_type
+
+    def cache_control(self, rel_path):
+        if rel_path.startswith(self.IMMUTABLE_DIRS):
+            return "public, max-age=31536000, immutable"
+
+        # pages and feeds are updated in place, so clients check for a new
+        # version each time (which is cheap with the ETag)
+        return "no-cache"
+
+    @staticmethod
+    def etag(st):
+        return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+    # whether the file should be sent compressed
+    def compressible(self, path, st):
+        ext = os.path.splitext(path)[1].lower()
+        return ext in self.COMPRESSIBLE and st.st_size >= self.MIN_COMPRESS_SIZE
+
+    # the path of a compressed copy of the file, creating it if needed.
+    # Returns None if there isn't one
+    def compressed(self, path, rel_path, st, ext, encoding):
+        sibling = path + ext
+        try:
+            if os.stat(sibling).st_mtime >= st.st_mtime:
+                return sibling
+        except OSError:
+            pass
+
+        if not self.cache_dir:
+            return None
+
+        # named by the file's ETag, so a changed file gets a new copy
+        name_hash = hashlib.sha256(rel_path.encode("utf-8")).hexdigest()[:16]
+        version = self.etag(st).strip('"')
+        cached = os.path.join(self.cache_dir, f"{name_hash}-{version}{ext}")
+
+        if os.path.exists(cached):
+            return cached
+
+        with open(path, "rb") as src, AtomicFile(cached) as dest:
+            if encoding == "br":
+                compressor = brotli.Compressor()
+                for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b""):
+                    dest.write(compressor.process(chunk))
+                dest.write(compressor.finish())
+            else:
+                with gzip.GzipFile(fileobj=dest, mode="wb", mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, self.CHUNK_SIZE)
+
+        # remove copies of previous versions of the file
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(f"{name_hash}-") and name.endswith(ext) and name != os.path.basename(cached):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+        return cached
+
+    # make the relative links in a podcast feed absolute
+    @staticmethod
+    def absolute_links(text, base):
+
+        def replace(match):
+            return f'{match.group(1)}="{urljoin(base, match.group(2))}"'
+
+        return re.sub(r'\b(url|href)="([^"]+)"', replace, text)
+
+    def _handler(self):
+        server = self
+
+        class Handler(FileRequestHandler):
+            file_server = server
+
+        return Handler
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class FileRequestHandler(BaseHTTPRequestHandler):
+    file_server = None
+
+    # keep connections open between requests
+    protocol_version = "HTTP/1.1"
+    server_version = "Digest"
+    timeout = FileServer.TIMEOUT
+
+    def do_GET(self):
+        self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def log_message(self, format, *args):
+        if self.file_server.verbose:
+            super().log_message(format, *args)
+
+    def serve(self, head):
+        fs = self.file_server
+        url_path = urlsplit(self.path).path
+        path, rel_path = fs.resolve(url_path)
+
+        if path is None or not os.path.exists(path):
+            self.send_error(404)
+            return
+
+        if os.path.isdir(path):
+            if not url_path.endswith("/"):
+                self.send_response(301)
+                self.send_header("Location", url_path + "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            path = os.path.join(path, fs.INDEX_FILE)
+            rel_path = posixpath.join(rel_path, fs.INDEX_FILE)
+
+        try:
+            st = os.stat(path)
+            if not os.path.isfile(path):
+                raise FileNotFoundError(path)
+
+            if os.path.basename(path) == fs.PODCAST_FILE:
+                self.serve_podcast(path, rel_path, head)
+            else:
+                self.serve_file(path, rel_path, st, head)
+        except FileNotFoundError:
+            self.send_error(404)
+        except PermissionError:
+            self.send_error(403)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away part way through the response
+            self.close_connection = True
+
+    def serve_file(self, path, rel_path, st, head):
+        fs = self.file_server
+        etag = fs.etag(st)
+        last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+        compressible = fs.compressible(path, st)
+
+        headers = {
+            "Content-Type": fs.content_type(path),
+            "Cache-Control": fs.cache_control(rel_path),
+            "Last-Modified": last_modified,
+            "Accept-Ranges": "bytes",
+        }
+
+        if compressible:
+            headers["Vary"] = "Accept-Encoding"
+
+        # ranges are only supported for the uncompressed file
+        byte_range = None
+        if self.headers.get("Range") and self.if_range(etag, last_modified):
+            try:
+                byte_range = self.parse_range(self.headers["Range"], st.st_size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{st.st_size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        send_path = path
+        size = st.st_size
+
+        if compressible and byte_range is None:
+            for ext, encoding in fs.encodings:
+                if not self.accepts_encoding(encoding):
+                    continue
+
+                compressed = fs.compressed(path, rel_path, st, ext, encoding)
+                if compressed:
+                    send_path = compressed
+                    size = os.path.getsize(compressed)
+                    etag = f'{etag[:-1]}-{encoding}"'
+                    headers["Content-Encoding"] = encoding
+                    break
+
+        headers["ETag"] = etag
+
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(304)
+            for name in ("ETag", "Cache-Control", "Last-Modified", "Vary"):
+                if name in headers:
+                    self.send_header(name, headers[name])
+            self.end_headers()
+            return
+
+        start, length = 0, size
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+        if head or not length:
+            return
+
+        with open(send_path, "rb") as f:
+            self.connection.sendfile(f, start, length)
+
+    # podcast.xml is small, and its links depend on the address it was
+    # requested from, so it is rewritten for each request
+    def serve_podcast(self, path, rel_path, head):
+        fs = self.file_server
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+        edition_dir = posixpath.dirname(rel_path)
+        base = f"{self.base_url()}/{edition_dir}/" if edition_dir else f"{self.base_url()}/"
+        body = fs.absolute_links(text, base).encode("utf-8")
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+        encoding = None
+        if self.accepts_encoding("gzip"):
+            body = gzip.compress(body, mtime=0)
+            etag = f'{etag[:-1]}-gzip"'
+            encoding = "gzip"
+
+        if self.not_modified(etag, None):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if not head:
+            self.wfile.write(body)
+
+    # the address the client used to reach the server, which may be through
+    # a reverse proxy
+    def base_url(self):
+        if self.file_server.base_url:
+            return self.file_server.base_url
+
+        scheme = self.headers.get("X-Forwarded-Proto", "http").split(",")[0].strip()
+        host = self.headers.get("X-Forwarded-Host") or self.headers.get("Host")
+
+        if not host:
+            host, port = self.server.server_address[:2]
+            host = f"{host}:{port}"
+
+        return f"{scheme}://{host.split(',')[0].strip()}"
+
+    def accepts_encoding(self, encoding):
+        for item in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = item.strip().partition(";")
+
+            if name.strip().lower() != encoding:
+                continue
+
+            match = re.search(r"q=([0-9.]+)", params)
+            return not match or float(match.group(1)) > 0
+
+        return False
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+            return int(mtime) <= since
+
+        return False
+
+    # a Range request is only honored if the file hasn't changed since the
+    # client's partial copy
+    def if_range(self, etag, last_modified):
+        if_range = self.headers.get("If-Range")
+        return not if_range or if_range in (etag, last_modified)
+
+    # parse a single byte range, returning (start, end) inclusive, or None
+    # to send the whole file (for multiple ranges, which aren't supported).
+    # Raises ValueError if the range can't be satisfied
+    @staticmethod
+    def parse_range(header, size):
+        match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+
+        if not match:
+            return None
+
+        first, last = match.groups()
+
+        if not first and not last:
+            return None
+
+        if not first:
+            # the last n bytes
+            length = int(last)
+            if length == 0:
+                raise ValueError(header)
+            return max(0, size - length), size - 1
+
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+        if start >= size or end < start:
+            raise ValueError(header)
+
+        return start, end
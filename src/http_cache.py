@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+from atomic_file import AtomicFile
+
+# On disk cache of retrieved pages. Each entry stores the body along with the
+# validators (ETag / Last-Modified) returned by the server, so that later
+# requests can be made conditionally, or skipped entirely when running from
+# the cache. Entries are sharded into sub directories by the first two
+# characters of the hash of their url.
+class HttpCache:
+    DIR_NAME = "http"
+
+    def __init__(self, cache_dir):
+        self.dir = os.path.join(cache_dir, self.DIR_NAME)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path_for(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.dir, key[:2], f"{key}.json")
+
+    # returns the cached entry for the url, or None if it hasn't been cached
+    def get(self, url):
+        path = self.path_for(url)
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    # store a successful response for the requested url
+    def set(self, url, response):
+        entry = {
+            "url": response.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "text": response.text,
+        }
+
+        path = self.path_for(url)
+        dir = os.path.dirname(path)
+        os.makedirs(dir, exist_ok=True)
+
+        # written atomically so concurrent readers never see a partially
+        # written entry
+        with AtomicFile(path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+
+        return entry
+
+    # headers to make a request conditional on the cached entry
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+
+        if entry is None:
+            return headers
+
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
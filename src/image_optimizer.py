@@ -0,0 +1,223 @@
+import heapq
+import json
+import os
+from concurrent.futures import as_completed
+
+from atomic_file import AtomicFile
+
+# Pillow is optional, and only needed for --optimize-images
+try:
+    from PIL import Image, ImageOps, UnidentifiedImageError, features
+except ImportError:
+    Image = None
+
+# Creates resized copies of the mirrored article images in a modern format
+# (WebP or AVIF), so they can be linked with srcset and a phone only
+# downloads an image as large as it will display.
+#
+# Resizing and encoding is CPU bound, so images are processed in a process
+# pool. Results are cached by the hash of the source image (the asset store
+# names files by the hash of their content), so each image is only processed
+# once, however many editions use it.
+class ImageOptimizer:
+    DIR_NAME = "images"
+    INDEX_FILE = "index.json"
+
+    # widths of the variants created, in pixels. Images are never enlarged
+    WIDTHS = (480, 800, 1200, 1600)
+
+    FORMATS = {
+        "webp": {"ext": ".webp", "mime": "image/webp", "quality": 75},
+        "avif": {"ext": ".avif", "mime": "image/avif", "quality": 55},
+    }
+    DEFAULT_FORMAT = "webp"
+
+    def __init__(self, root, executor, image_format=DEFAULT_FORMAT, widths=WIDTHS):
+        self.root = root
+        self.executor = executor
+        self.image_format = image_format
+        self.widths = tuple(sorted(widths))
+        self.dir = os.path.join(root, self.DIR_NAME)
+        self.index_path = os.path.join(self.dir, self.INDEX_FILE)
+
+        # images are processed again if any of these change
+        quality = self.FORMATS[image_format]["quality"]
+        self.settings = f"{image_format}:{quality}:{','.join(map(str, self.widths))}"
+
+        os.makedirs(self.dir, exist_ok=True)
+
+        # source hash to the variants created for it
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.index = {}
+
+    @staticmethod
+    def available():
+        return Image is not None
+
+    # the formats that the installed version of Pillow can write
+    @classmethod
+    def supported_formats(cls):
+        if Image is None:
+            return []
+
+        return [f for f in cls.FORMATS if features.check(f)]
+
+    def mime_type(self):
+        return self.FORMATS[self.image_format]["mime"]
+
+    # returns the cached result for the source image (a path relative to the
+    # root), or None if it needs to be processed
+    def lookup(self, path):
+        entry = self.index.get(self.source_hash(path))
+
+        if not entry or entry["settings"] != self.settings:
+            return None
+
+        for variant in entry.get("variants", []):
+            if not os.path.exists(os.path.join(self.root, variant["path"])):
+                return None
+
+        return entry
+
+    # process the source images (paths relative to the root). Returns a dict
+    # of path to result, for the images that could be optimized, a dict of
+    # path to error for those that failed, and the number of images that
+    # were processed rather than read from the cache. Results have the
+    # width and height of the source, and a list of variants, each with a
+    # path (relative to the root), width and size in bytes
+    def optimize_all(self, paths):
+        results = {}
+        errors = {}
+        futures = {}
+
+        for path in set(paths):
+            entry = self.lookup(path)
+
+            if entry:
+                if entry.get("variants"):
+                    results[path] = entry
+                continue
+
+            source_hash = self.source_hash(path)
+            dest_dir = os.path.join(self.dir, source_hash[:2])
+            os.makedirs(dest_dir, exist_ok=True)
+
+            future = self.executor.submit(
+                resize_image,
+                os.path.join(self.root, path),
+                os.path.join(dest_dir, source_hash),
+                self.widths,
+                self.image_format,
+                self.FORMATS[self.image_format]
+            )
+            futures[future] = path
+
+        for future in as_completed(futures):
+            path = futures[future]
+
+            try:
+                result = future.result()
+            except Exception as e:
+                errors[path] = e
+                continue
+
+            # images Pillow can't read (or animations) are left as they are
+            entry = {"settings": self.settings, **(result or {})}
+
+            for variant in entry.get("variants", []):
+                variant["path"] = os.path.relpath(variant["path"], self.root)
+
+            self.index[self.source_hash(path)] = entry
+
+            if entry.get("variants"):
+                results[path] = entry
+
+        if futures:
+            self.save()
+
+        return results, errors, len(futures)
+
+    def save(self):
+        with AtomicFile(self.index_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+
+    # files in the asset store are named by the hash of their content
+    @staticmethod
+    def source_hash(path):
+        return os.path.splitext(os.path.basename(path))[0]
+
+    # limit the total size of the images in an edition to budget bytes, by
+    # dropping the largest variants, starting with the largest image, until
+    # the largest remaining variant of every image fits. The smallest variant
+    # of each image is always kept. Returns a dict of path to the variants
+    # to use
+    @staticmethod
+    def apply_budget(results, budget):
+        variants = {path: list(entry["variants"]) for path, entry in results.items()}
+
+        if not budget:
+            return variants
+
+        total = sum(v[-1]["bytes"] for v in variants.values())
+        heap = [(-v[-1]["bytes"], path) for path, v in variants.items() if len(v) > 1]
+        heapq.heapify(heap)
+
+        while total > budget and heap:
+            _, path = heapq.heappop(heap)
+            v = variants[path]
+
+            total -= v.pop()["bytes"] - v[-1]["bytes"]
+
+            if len(v) > 1:
+                heapq.heappush(heap, (-v[-1]["bytes"], path))
+
+        return variants
+
+# create the resized variants of an image. Run in the process pool, so it
+# is a function rather than a method. Returns None if the image can't be
+# optimized
+def resize_image(source, dest_prefix, widths, image_format, options):
+    try:
+        image = Image.open(source)
+    except UnidentifiedImageError:
+        return None
+
+    with image:
+        if getattr(image, "is_animated", False):
+            return None
+
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        # variants narrower than the image, plus one at full width (up to
+        # the largest width)
+        targets = sorted({w for w in widths if w < width} | {min(width, widths[-1])})
+
+        variants = []
+        for target in targets:
+            target_height = max(1, round(height * target / width))
+
+            resized = image
+            if target != width:
+                resized = image.resize((target, target_height), Image.LANCZOS)
+
+            path = f"{dest_prefix}-{target}{options['ext']}"
+
+            # written atomically, so a crash never leaves a partial image in
+            # the cache
+            with AtomicFile(path) as f:
+                resized.save(f, format=image_format.upper(), quality=options["quality"])
+
+            variants.append({
+                "path": path,
+                "width": target,
+                "bytes": os.path.getsize(path)
+            })
+
+    return {"width": width, "height": height, "variants": variants}
@@ -0,0 +1,115 @@
+import re
+from contextlib import contextmanager
+
+import requests
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+# An error returned by the server, or a response that stalled. The request
+# can be retried, or the summary skipped
+class LLMError(RuntimeError):
+    pass
+
+# Base class for the servers used to generate summaries.
+#
+# prompt() returns the response in the form of a non streaming Ollama
+# /api/chat response, whichever server it came from:
+#
+#   {"message": {"role": "assistant", "content": "..."}, "done": True,
+#    "prompt_eval_count": ..., "eval_count": ..., ...}
+#
+# or {"error": "..."} if the server returned an error. Token counts and
+# durations (in nanoseconds) are included when the server provides them.
+class LLMBackend:
+    NAME = None
+    DEFAULT_BASE_URL = None
+    DEFAULT_LLM = "llama3.1"
+    API_TIMEOUT = 300
+    CONNECT_TIMEOUT = 10
+    NUM_CTX = 8192
+
+    # abort a streamed response if no tokens arrive for this many seconds
+    DEFAULT_STALL_TIMEOUT = 60
+
+    # the first token can take much longer, as the request may be queued
+    # behind others, and the prompt is evaluated before it is sent
+    FIRST_TOKEN_TIMEOUT = 300
+
+    # errors that retrying won't fix, such as the model not being available
+    # on the server, or the server rejecting the API key
+    FATAL_ERROR_REGEX = re.compile(
+        r"\bmodel\b.*\b(not found|does not exist)|\bapi key\b|^HTTP 40[134]$",
+        re.IGNORECASE
+    )
+
+    def __init__(self, llm=DEFAULT_LLM, base_url=None,
+                 stall_timeout=DEFAULT_STALL_TIMEOUT, pool_size=1, num_ctx=NUM_CTX):
+        self.session = None
+        self.llm = llm
+        self.base_url = base_url or self.DEFAULT_BASE_URL
+        self.stall_timeout = stall_timeout
+        self.pool_size = pool_size
+        self.num_ctx = num_ctx
+        self.init_session()
+
+    def init_session(self):
+        self.session = Session()
+
+        # one connection per concurrent request, kept open between requests
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # start loading the model in the background, for servers that support it
+    def start_load(self):
+        pass
+
+    def prompt(self, prompt):
+        raise NotImplementedError
+
+    # post a request with a streamed response. The response is read with
+    # iter_lines, which only applies the stall timeout once the first line
+    # has arrived, so a stalled generation is caught without waiting for the
+    # whole API timeout
+    @contextmanager
+    def post_stream(self, url, data, headers=None):
+        timeout = (self.CONNECT_TIMEOUT, self.FIRST_TOKEN_TIMEOUT)
+
+        try:
+            with self.session.post(url, headers=headers, json=data, timeout=timeout, stream=True) as response:
+                yield response
+        except requests.exceptions.ReadTimeout:
+            raise self.stall_error(self.FIRST_TOKEN_TIMEOUT)
+
+    # the lines of a streamed response. The timeout of each read from the
+    # socket is the stall timeout once the first line has been read
+    def iter_lines(self, response):
+        timeout = self.FIRST_TOKEN_TIMEOUT
+
+        try:
+            for line in response.iter_lines():
+                if line and timeout != self.stall_timeout:
+                    timeout = self.stall_timeout
+                    self.set_read_timeout(response, timeout)
+
+                yield line
+        except requests.exceptions.ConnectionError as e:
+            # timeouts while reading the body are raised as connection errors
+            if e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise self.stall_error(timeout)
+            raise
+
+    @staticmethod
+    def set_read_timeout(response, timeout):
+        connection = getattr(response.raw, "connection", None) or getattr(response.raw, "_connection", None)
+        sock = getattr(connection, "sock", None)
+
+        if sock is not None:
+            sock.settimeout(timeout)
+
+    def is_fatal_error(self, error):
+        return bool(self.FATAL_ERROR_REGEX.search(str(error)))
+
+    def stall_error(self, timeout):
+        return TimeoutError(f"No response from {self.NAME} for {timeout} seconds")
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+from atomic_file import AtomicFile
+
+# Record of what was built for an edition, stored in the edition directory.
+# It keeps the parsed articles (so they don't need to be retrieved again) and
+# a hash of the inputs used to render each output file, so files are only
+# rewritten when something that affects them has changed.
+class Manifest:
+    FILE_NAME = "manifest.json"
+    VERSION = 1
+
+    def __init__(self, edition_dir):
+        self.edition_dir = edition_dir
+        self.path = os.path.join(edition_dir, self.FILE_NAME)
+        self.articles = {}
+        self.outputs = {}
+        self.seen = set()
+
+    # load an existing manifest for the edition, if there is one
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+
+        if data.get("version") != self.VERSION:
+            return False
+
+        self.articles = data.get("articles", {})
+        self.outputs = data.get("outputs", {})
+        return True
+
+    def save(self):
+        data = {
+            "version": self.VERSION,
+            "articles": self.articles,
+            "outputs": self.outputs,
+        }
+
+        with AtomicFile(self.path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def set_articles(self, articles):
+        self.articles = {a["url"]: a for a in articles}
+
+    # record the hash of the inputs for an output file. Returns True if the
+    # file needs to be written, and False if it already exists and was built
+    # from the same inputs
+    def update_output(self, path, digest):
+        rel_path = os.path.relpath(path, self.edition_dir)
+        self.seen.add(rel_path)
+
+        if self.outputs.get(rel_path) == digest and os.path.exists(path):
+            return False
+
+        self.outputs[rel_path] = digest
+        return True
+
+    # remove output files from a previous build that weren't part of this one
+    # (such as articles that have since been removed from the edition).
+    # Returns the list of removed paths
+    def prune(self):
+        removed = []
+
+        for rel_path in list(self.outputs):
+            if rel_path in self.seen:
+                continue
+
+            del self.outputs[rel_path]
+
+            path = os.path.join(self.edition_dir, rel_path)
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+
+        return removed
+
+    # parts can include the edition model objects, which are hashed by their
+    # contents
+    @staticmethod
+    def hash_data(*parts):
+        data = json.dumps(parts, sort_keys=True, default=Manifest._hashable)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _hashable(value):
+        if hasattr(value, "to_dict"):
+            return value.to_dict()
+
+        return str(value)
+
+    # hash the contents of all of the files in a directory
+    @staticmethod
+    def hash_files(dir):
+        h = hashlib.sha256()
+
+        for name in sorted(os.listdir(dir)):
+            path = os.path.join(dir, name)
+
+            if not os.path.isfile(path):
+                continue
+
+            h.update(name.encode("utf-8"))
+            with open(path, "rb") as f:
+                h.update(f.read())
+
+        return h.hexdigest()
@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from atomic_file import AtomicFile
+
+# Collects counters and latency histograms while the script runs, and
+# produces the machine readable run report. Safe to use from the fetch and
+# summary threads.
+class Metrics:
+    # upper bounds, in seconds, of the latency histogram buckets
+    BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        with self.lock:
+            self.samples.setdefault(name, []).append(value)
+
+    # time the enclosed block, recording it in the named histogram
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    # record the token counts and timings returned by the LLM server
+    def record_llm(self, data):
+        eval_count = data.get("eval_count")
+        eval_duration = data.get("eval_duration")
+
+        if eval_count:
+            self.increment("llm.eval_tokens", eval_count)
+
+        if data.get("prompt_eval_count"):
+            self.increment("llm.prompt_tokens", data["prompt_eval_count"])
+
+        # durations are in nanoseconds
+        if eval_count and eval_duration:
+            self.observe("llm.tokens_per_second", eval_count / (eval_duration / 1e9))
+
+        if data.get("prompt_eval_count") and data.get("prompt_eval_duration"):
+            self.observe(
+                "llm.tokens_per_second.prompt",
+                data["prompt_eval_count"] / (data["prompt_eval_duration"] / 1e9)
+            )
+
+        # time spent loading the model. Large values mean it was unloaded
+        # between requests
+        if data.get("load_duration"):
+            self.observe("llm.load", data["load_duration"] / 1e9)
+
+    @staticmethod
+    def percentile(values, p):
+        index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+        return values[index]
+
+    def summarize(self, name, values):
+        values = sorted(values)
+
+        # tokens per second isn't a latency, so doesn't get buckets
+        buckets = None
+        if not name.startswith("llm.tokens_per_second"):
+            buckets = {}
+            for bound in self.BUCKETS + [float("inf")]:
+                key = "+Inf" if bound == float("inf") else str(bound)
+                buckets[key] = sum(1 for v in values if v <= bound)
+
+        summary = {
+            "count": len(values),
+            "total": sum(values),
+            "min": values[0],
+            "max": values[-1],
+            "mean": sum(values) / len(values),
+            "p50": self.percentile(values, 50),
+            "p95": self.percentile(values, 95),
+        }
+
+        if buckets is not None:
+            summary["buckets"] = buckets
+
+        return summary
+
+    def report(self, **extra):
+        with self.lock:
+            counters = dict(self.counters)
+            samples = {name: list(values) for name, values in self.samples.items()}
+
+        report = {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "duration": time.time() - self.started,
+        }
+        report.update(extra)
+        report["counters"] = counters
+        report["histograms"] = {
+            name: self.summarize(name, values) for name, values in samples.items() if values
+        }
+
+        return report
+
+    def write(self, path, **extra):
+        with AtomicFile(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(**extra), f, indent=2)
@@ -0,0 +1,108 @@
+import json
+from dataclasses import dataclass, field, fields
+
+# The parsed contents of an edition. These are used for all of the
+# processing and rendering of an edition, and can be saved to (and loaded
+# from) JSON, so an edition can be rendered again without retrieving it.
+#
+# Field names match the keys used by the templates, and slots keep the
+# memory used per article down when building many editions.
+
+@dataclass(slots=True)
+class Article:
+    title: str
+    url: str
+    file_name: str
+    dir: str
+    content: list = field(default_factory=list)
+    subtitle: str = ""
+    section_blurb: str | None = None
+    mp3: str | None = None
+    summary: list | None = None
+    relevance: str | None = None
+    article_section_index: int = 0
+    article_section_total: int = 0
+
+    # local copies of the article's images and mp3, as url to path relative
+    # to the root output directory
+    assets: dict = field(default_factory=dict)
+
+    # resized copies of the article's images, as url to the image's size
+    # and variants
+    images: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    # unknown keys are ignored, so data saved by other versions still loads
+    @classmethod
+    def from_dict(cls, data):
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+
+@dataclass(slots=True)
+class Section:
+    # the entry from SECTION_INFO (title, slug, summarize and priority)
+    section: dict
+    urls: list = field(default_factory=list)
+    articles: list = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            "section": self.section,
+            "urls": self.urls,
+            "articles": [a.to_dict() for a in self.articles],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            section=data["section"],
+            urls=data.get("urls", []),
+            articles=[Article.from_dict(a) for a in data.get("articles", [])],
+        )
+
+@dataclass(slots=True)
+class Edition:
+    FILE_NAME = "edition.json"
+    VERSION = 1
+
+    # directory name (YYYY-MM-DD), title and url of the edition
+    slug: str
+    title: str
+    url: str
+    sections: list = field(default_factory=list)
+    generator: str | None = None
+
+    def to_dict(self):
+        return {
+            "version": self.VERSION,
+            "generator": self.generator,
+            "slug": self.slug,
+            "title": self.title,
+            "url": self.url,
+            "sections": [s.to_dict() for s in self.sections],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("version") != cls.VERSION:
+            raise ValueError(f"Unsupported edition file version : {data.get('version')}")
+
+        return cls(
+            slug=data["slug"],
+            title=data["title"],
+            url=data["url"],
+            sections=[Section.from_dict(s) for s in data["sections"]],
+            generator=data.get("generator"),
+        )
+
+    # the JSON for the edition, as an iterable of strings, so it can be
+    # streamed to a file
+    def iter_json(self):
+        return json.JSONEncoder(ensure_ascii=False, indent=1).iterencode(self.to_dict())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from atomic_file import AtomicFile
+
+# Determines the byte length and duration of mp3 files without downloading
+# them. The length comes from the Content-Length of a HEAD request, and the
+# duration from the first frame header (and the Xing / Info or VBRI header
+# that VBR files have in their first frame), retrieved with a small ranged
+# GET. Results are cached by url.
+class Mp3Probe:
+    CACHE_FILE = "mp3_probe.json"
+    PROBE_BYTES = 8 * 1024
+    TIMEOUT = 30
+
+    # bitrates in kbps, by [version is MPEG1][layer][index]
+    BITRATES = {
+        True: {
+            1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+            2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+            3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+        },
+        False: {
+            1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+            2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+            3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        },
+    }
+
+    # sample rates by version id (bits from the frame header)
+    SAMPLE_RATES = {
+        3: [44100, 48000, 32000],  # MPEG1
+        2: [22050, 24000, 16000],  # MPEG2
+        0: [11025, 12000, 8000],   # MPEG2.5
+    }
+
+    def __init__(self, session=None, cache_dir=None):
+        self.session = session
+        self.lock = threading.Lock()
+        self.cache = {}
+        self.cache_path = None
+
+        if cache_dir:
+            self.cache_path = os.path.join(cache_dir, self.CACHE_FILE)
+
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self.cache = {}
+
+    # probe each of the urls concurrently. paths maps urls to local copies of
+    # the file, which are read instead of making requests. Returns a dict of
+    # url to {"length", "duration"}, for the urls that could be probed
+    def probe_all(self, urls, paths=None, workers=4):
+        paths = paths or {}
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.probe, url, paths.get(url)): url for url in set(urls)}
+
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    continue
+
+                if result:
+                    results[futures[future]] = result
+
+        self.save()
+
+        return results
+
+    def probe(self, url, path=None):
+        with self.lock:
+            cached = self.cache.get(url)
+
+        if cached:
+            return cached
+
+        if path:
+            result = self.probe_file(path)
+        elif self.session:
+            result = self.probe_url(url)
+        else:
+            return None
+
+        if result:
+            with self.lock:
+                self.cache[url] = result
+
+        return result
+
+    def probe_file(self, path):
+        length = os.path.getsize(path)
+
+        with open(path, "rb") as f:
+            data = f.read(self.PROBE_BYTES)
+
+            # skip over an ID3 tag that is larger than what we read
+            tag_size = self.id3_size(data)
+            if tag_size and tag_size >= len(data):
+                f.seek(tag_size)
+                return self.result(length, f.read(self.PROBE_BYTES), 0, tag_size)
+
+        return self.result(length, data, tag_size, tag_size)
+
+    def probe_url(self, url):
+        response = self.session.head(url, allow_redirects=True, timeout=self.TIMEOUT)
+        length = int(response.headers.get("Content-Length", 0)) or None
+
+        data, total = self.read_range(url, 0)
+
+        if length is None:
+            length = total
+
+        if not length:
+            return None
+
+        tag_size = self.id3_size(data)
+        if tag_size and tag_size >= len(data):
+            data, _ = self.read_range(url, tag_size)
+            return self.result(length, data, 0, tag_size)
+
+        return self.result(length, data, tag_size, tag_size)
+
+    # read PROBE_BYTES from the url starting at offset. Returns the data and
+    # the total size of the file (if the server reported it)
+    def read_range(self, url, offset):
+        headers = {"Range": f"bytes={offset}-{offset + self.PROBE_BYTES - 1}"}
+
+        with self.session.get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            if response.status_code not in (200, 206):
+                raise Exception(f"Non 200 Status code returned ({response.status_code}) : {url}")
+
+            if response.status_code == 200 and offset:
+                raise Exception(f"Server does not support range requests : {url}")
+
+            # if the range is ignored, stop reading after the bytes we need
+            # rather than downloading the whole file
+            data = b""
+            for chunk in response.iter_content(chunk_size=self.PROBE_BYTES):
+                data += chunk
+                if len(data) >= self.PROBE_BYTES:
+                    break
+
+            total = None
+            match = re.search(r"/(\d+)$", response.headers.get("Content-Range", ""))
+            if match:
+                total = int(match.group(1))
+
+        return data[:self.PROBE_BYTES], total
+
+    # size of the ID3v2 tag at the start of the file (0 if there isn't one)
+    @staticmethod
+    def id3_size(data):
+        if len(data) < 10 or data[:3] != b"ID3":
+            return 0
+
+        # size is stored as a 28 bit syncsafe integer
+        size = 0
+        for b in data[6:10]:
+            size = (size << 7) | (b & 0x7F)
+
+        footer = 10 if data[5] & 0x10 else 0
+
+        return 10 + size + footer
+
+    # build the result from the first bytes of the audio. search_start is
+    # where to look for the first frame in data, and audio_start is the
+    # offset of the audio within the file
+    def result(self, length, data, search_start, audio_start):
+        duration = self.duration(data, search_start, length - audio_start)
+
+        return {"length": length, "duration": int(round(duration)) if duration else None}
+
+    def duration(self, data, start, audio_bytes):
+        frame = self.find_frame(data, start)
+
+        if frame is None:
+            return None
+
+        offset, mpeg1, layer, bitrate, sample_rate, mono = frame
+        samples_per_frame = 384 if layer == 1 else (1152 if mpeg1 or layer == 2 else 576)
+
+        # Xing / Info header follows the side information of the first frame
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        xing = offset + 4 + side_info
+
+        if data[xing:xing + 4] in (b"Xing", b"Info") and len(data) >= xing + 12:
+            flags = struct.unpack(">I", data[xing + 4:xing + 8])[0]
+
+            if flags & 0x1:
+                frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+                return frames * samples_per_frame / sample_rate
+
+        # VBRI header is always 32 bytes after the frame header
+        vbri = offset + 4 + 32
+        if data[vbri:vbri + 4] == b"VBRI" and len(data) >= vbri + 18:
+            frames = struct.unpack(">I", data[vbri + 14:vbri + 18])[0]
+            return frames * samples_per_frame / sample_rate
+
+        # no VBR header, so assume a constant bitrate
+        return audio_bytes * 8 / (bitrate * 1000)
+
+    # find the first valid frame header, returning
+    # (offset, mpeg1, layer, bitrate, sample rate, mono)
+    def find_frame(self, data, start):
+        for i in range(start, len(data) - 4):
+            if data[i] != 0xFF or (data[i + 1] & 0xE0) != 0xE0:
+                continue
+
+            version = (data[i + 1] >> 3) & 0x3
+            layer = 4 - ((data[i + 1] >> 1) & 0x3)
+            bitrate_index = (data[i + 2] >> 4) & 0xF
+            sample_index = (data[i + 2] >> 2) & 0x3
+            mono = ((data[i + 3] >> 6) & 0x3) == 3
+
+            if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_index == 3:
+                continue
+
+            mpeg1 = version == 3
+            bitrate = self.BITRATES[mpeg1][layer][bitrate_index]
+            sample_rate = self.SAMPLE_RATES[version][sample_index]
+
+            return i, mpeg1, layer, bitrate, sample_rate, mono
+
+        return None
+
+    def save(self):
+        if not self.cache_path:
+            return
+
+        with self.lock:
+            data = json.dumps(self.cache)
+
+        dir = os.path.dirname(self.cache_path)
+        os.makedirs(dir, exist_ok=True)
+
+        with AtomicFile(self.cache_path, "w", encoding="utf-8") as f:
+            f.write(data)
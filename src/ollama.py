@@ -1,22 +1,58 @@
 import requests
 import json
-from requests import Session
+import time
+import threading
+from llm_backend import LLMBackend
 
-class Ollama:
+class Ollama(LLMBackend):
+    NAME = "Ollama"
     DEFAULT_BASE_URL = "http://localhost:11434"
-    DEFAULT_LLM = "llama3.1"
-    API_TIMEOUT = 300
-    NUM_CTX = 8192
 
-    def __init__(self, llm=DEFAULT_LLM, base_url=DEFAULT_BASE_URL ):
-        self.session = None
-        self.llm = llm
-        self.base_url = base_url
-        self.init_session()
+    # how long the server keeps the model loaded after a request. Long enough
+    # that it isn't unloaded while waiting for articles to be retrieved
+    DEFAULT_KEEP_ALIVE = "30m"
 
-    def init_session(self):
-        self.session = Session()
+    # fields from the final response that are kept when streaming
+    STAT_FIELDS = (
+        "total_duration", "load_duration",
+        "prompt_eval_count", "prompt_eval_duration",
+        "eval_count", "eval_duration",
+    )
 
+    def __init__(self, keep_alive=DEFAULT_KEEP_ALIVE, stream=True, **kwargs):
+        self.keep_alive = keep_alive
+        self.stream = stream
+        self.loading = None
+        super().__init__(**kwargs)
+
+    # start loading the model into memory in the background, so it is ready
+    # by the time the first prompt is sent. Prompts sent while the model is
+    # loading wait for it to finish, so the load time doesn't count as a stall
+    def start_load(self):
+        self.loading = threading.Event()
+        threading.Thread(target=self.load, daemon=True).start()
+
+    def load(self):
+        data = {
+            "model": self.llm,
+            "messages": [],
+            "keep_alive": self.keep_alive,
+        }
+
+        url = f"{self.base_url}/api/chat"
+
+        try:
+            response = self.session.post(url, json=data, timeout = self.API_TIMEOUT)
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError):
+            # any problem will be reported by the first prompt
+            return None
+        finally:
+            if self.loading:
+                self.loading.set()
+
+    # send a prompt and return the response, in the form returned by a
+    # non streaming /api/chat request
     def prompt(self, prompt):
 
         data = {
@@ -27,11 +63,12 @@ class Ollama:
                     "content": prompt
                 }
             ],
-            "stream": False,
+            "stream": self.stream,
             "format": "json",
             "temperature": 0,
+            "keep_alive": self.keep_alive,
             "options" : {
-                "num_ctx": self.NUM_CTX
+                "num_ctx": self.num_ctx
             }
         }
 
@@ -40,6 +77,50 @@ class Ollama:
         }
 
         url = f"{self.base_url}/api/chat"
-        response = self.session.post(url, headers=headers, json=data, timeout = self.API_TIMEOUT)
 
-        return response.json()
+        if not self.stream:
+            response = self.session.post(url, headers=headers, json=data, timeout = self.API_TIMEOUT)
+            return response.json()
+
+        if self.loading:
+            self.loading.wait(self.API_TIMEOUT)
+
+        with self.post_stream(url, data, headers) as response:
+            return self.read_stream(response)
+
+    # combine the chunks of a streamed response into a single response
+    def read_stream(self, response):
+        deadline = time.monotonic() + self.API_TIMEOUT
+        content = []
+        result = None
+
+        for line in self.iter_lines(response):
+            if not line:
+                continue
+
+            chunk = json.loads(line)
+
+            # errors are returned as a single object, like non streamed responses
+            if "error" in chunk:
+                return chunk
+
+            message = chunk.get("message")
+            if message:
+                content.append(message.get("content", ""))
+
+            if chunk.get("done"):
+                result = {k: chunk[k] for k in self.STAT_FIELDS if k in chunk}
+                result["done_reason"] = chunk.get("done_reason")
+                break
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Ollama response took longer than {self.API_TIMEOUT} seconds")
+
+        if result is None:
+            raise requests.exceptions.ConnectionError("Ollama response ended before it was complete")
+
+        result["model"] = self.llm
+        result["message"] = {"role": "assistant", "content": "".join(content)}
+        result["done"] = True
+
+        return result
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from llm_backend import LLMBackend
+
+# Backend for servers with an OpenAI compatible /v1/chat/completions API,
+# such as the llama.cpp server and vLLM. The context size is set when the
+# server is started, so num_ctx is only used to size the prompts.
+#
+# If the OPENAI_API_KEY environment variable is set, it is sent as a bearer
+# token.
+class OpenAICompatible(LLMBackend):
+    NAME = "OpenAI compatible server"
+    DEFAULT_BASE_URL = "http://localhost:8080"
+    API_KEY_ENV = "OPENAI_API_KEY"
+
+    # the summaries are short, so this only stops runaway generations
+    MAX_TOKENS = 1024
+
+    def prompt(self, prompt):
+
+        data = {
+            "model": self.llm,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "response_format": {"type": "json_object"},
+            "temperature": 0,
+            "max_tokens": self.MAX_TOKENS
+        }
+
+        headers = {
+            "Content-Type": "application/json"
+        }
+
+        api_key = os.environ.get(self.API_KEY_ENV)
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        url = f"{self.base_url.rstrip('/')}/v1/chat/completions"
+
+        with self.post_stream(url, data, headers) as response:
+            if response.status_code != 200:
+                return {"error": self.read_error(response)}
+
+            return self.read_stream(response)
+
+    def read_error(self, response):
+        try:
+            error = response.json().get("error")
+        except ValueError:
+            error = None
+
+        if isinstance(error, dict):
+            error = error.get("message")
+
+        return error or f"HTTP {response.status_code}"
+
+    # combine the server sent events of a streamed response into a single
+    # response, in the form returned by Ollama
+    def read_stream(self, response):
+        start = time.perf_counter_ns()
+        deadline = time.monotonic() + self.API_TIMEOUT
+        first_token = None
+        content = []
+        usage = None
+        timings = None
+        finish_reason = None
+        done = False
+
+        for line in self.iter_lines(response):
+            if not line or not line.startswith(b"data:"):
+                continue
+
+            payload = line[len(b"data:"):].strip()
+            if payload == b"[DONE]":
+                done = True
+                break
+
+            chunk = json.loads(payload)
+
+            if "error" in chunk:
+                error = chunk["error"]
+                return {"error": error.get("message") if isinstance(error, dict) else error}
+
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    if first_token is None:
+                        first_token = time.perf_counter_ns()
+                    content.append(text)
+
+                finish_reason = choice.get("finish_reason") or finish_reason
+
+            usage = chunk.get("usage") or usage
+
+            # llama.cpp reports its own timings
+            timings = chunk.get("timings") or timings
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{self.NAME} response took longer than {self.API_TIMEOUT} seconds")
+
+        if not done and finish_reason is None:
+            raise ConnectionError(f"{self.NAME} response ended before it was complete")
+
+        end = time.perf_counter_ns()
+
+        result = {
+            "model": self.llm,
+            "message": {"role": "assistant", "content": "".join(content)},
+            "done": True,
+            "done_reason": finish_reason,
+            "total_duration": end - start,
+        }
+
+        if usage:
+            result["prompt_eval_count"] = usage.get("prompt_tokens")
+            result["eval_count"] = usage.get("completion_tokens")
+
+        # durations are in nanoseconds, like Ollama
+        if timings:
+            result["prompt_eval_duration"] = int(timings.get("prompt_ms", 0) * 1e6)
+            result["eval_duration"] = int(timings.get("predicted_ms", 0) * 1e6)
+        elif first_token is not None:
+            result["prompt_eval_duration"] = first_token - start
+            result["eval_duration"] = end - first_token
+
+        return result
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic_file import AtomicFile
+
+# Writes the output files for an edition from a pool of threads.
+#
+# Files can be written from a string, or from an iterable of strings (such
+# as a Jinja template's generate()), which is consumed as the file is
+# written, so the full page is never held in memory. Since generate() is
+# lazy, this also moves the rendering into the pool.
+#
+# Files are written with AtomicFile, so an interrupted build never leaves a
+# partially written file.
+class OutputWriter:
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, workers=DEFAULT_WORKERS, metrics=None, verbose=False):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.metrics = metrics
+        self.verbose = verbose
+        self.futures = []
+        self.dirs = set()
+        self.lock = threading.Lock()
+
+    # queue the data to be written to path. timer is the name of the metric
+    # the time taken to render and write the file is recorded in
+    def write(self, path, data, timer="write_file"):
+        self.futures.append(self.executor.submit(self._write, path, data, timer))
+
+    # wait for all of the files to be written, raising the first error
+    def close(self):
+        try:
+            for future in self.futures:
+                future.result()
+        except BaseException:
+            for future in self.futures:
+                future.cancel()
+            raise
+        finally:
+            self.executor.shutdown()
+
+    def _write(self, path, data, timer):
+        start = time.perf_counter()
+
+        dir_path = os.path.dirname(path)
+        self._create_dir(dir_path)
+
+        if self.verbose:
+            print(f"Writing file to : {path}")
+
+        if isinstance(data, str):
+            data = (data,)
+
+        with AtomicFile(path, "w", encoding="utf-8") as f:
+            for chunk in data:
+                f.write(chunk)
+
+        size = os.path.getsize(path)
+
+        if self.metrics:
+            self.metrics.observe(timer, time.perf_counter() - start)
+            self.metrics.increment("files.written")
+            self.metrics.increment("files.bytes_written", size)
+
+    # create each directory once, rather than checking for it on every write
+    def _create_dir(self, path):
+        with self.lock:
+            if path in self.dirs:
+                return
+
+            os.makedirs(path, exist_ok=True)
+            self.dirs.add(path)
@@ -0,0 +1,56 @@
+import re
+from bs4 import SoupStrainer
+
+PARSERS = ["auto", "lxml", "html.parser"]
+
+# resolve the BeautifulSoup backend to use. auto uses lxml, which is much
+# faster than the pure Python html.parser, when it is installed
+def resolve_parser(name="auto"):
+    if name != "auto":
+        return name
+
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+# Strainer that only builds the tags (and their contents) that we extract
+# from a page, so the rest of the document tree is never materialized.
+# Rules are a list of (tag name, attrs) pairs, where each attr value is either
+# a string that must match (for class, all of the listed classes must be
+# present) or a compiled regex that must match somewhere in the value.
+class TagStrainer(SoupStrainer):
+
+    def __init__(self, rules):
+        super().__init__()
+        self.rules = rules
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        for rule_name, rule_attrs in self.rules:
+            if name == rule_name and self.attrs_match(attrs or {}, rule_attrs):
+                return True
+
+        return False
+
+    @staticmethod
+    def attrs_match(attrs, rule_attrs):
+        for key, expected in rule_attrs.items():
+            value = attrs.get(key)
+
+            if value is None:
+                return False
+
+            if isinstance(value, list):
+                value = " ".join(value)
+
+            if isinstance(expected, re.Pattern):
+                if not expected.search(value):
+                    return False
+            elif key == "class":
+                if not set(expected.split()).issubset(value.split()):
+                    return False
+            elif value != expected:
+                return False
+
+        return True
@@ -0,0 +1,74 @@
+import threading
+import time
+
+# Token bucket used to keep requests to the Economist polite when articles
+# are being retrieved from multiple threads. Tokens refill at `rate` per
+# second, up to `capacity`, and each request consumes a single token.
+#
+# The rate adapts to how the server responds: it is halved when we are rate
+# limited (down to min_rate), and slowly increases again (up to the rate it
+# started at) as requests succeed.
+class RateLimiter:
+    DEFAULT_RATE = 1.0
+    DEFAULT_CAPACITY = 2
+
+    # amount the rate increases by, as a fraction of the max rate, for each
+    # successful request
+    SPEED_UP_STEP = 0.05
+
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_CAPACITY, min_rate=None):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 8
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    # block until a token is available. The token is reserved while holding
+    # the lock, and the wait happens outside of it, so waiting threads queue
+    # up in order instead of all waking at once.
+    def acquire(self):
+
+        with self.lock:
+            wait = max(0, self.paused_until - time.monotonic())
+
+            if self.rate > 0:
+                self.refill()
+                self.tokens -= 1
+
+                if self.tokens < 0:
+                    wait += -self.tokens / self.rate
+
+        if wait > 0:
+            time.sleep(wait)
+
+    # hold all requests for the specified number of seconds
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # called when the server rate limits us
+    def slow_down(self):
+        with self.lock:
+            if self.rate <= 0:
+                return
+
+            self.refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    # called when a request succeeds
+    def speed_up(self):
+        with self.lock:
+            if self.rate <= 0 or self.rate >= self.max_rate:
+                return
+
+            self.refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.SPEED_UP_STEP)
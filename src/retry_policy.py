@@ -0,0 +1,69 @@
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Decides whether, and how long to wait before, a failed request is retried.
+# Delays use exponential backoff with full jitter, unless the server told us
+# how long to wait via Retry-After. Retries across the whole run are limited
+# by a shared budget so a struggling server can't stall the run indefinitely.
+class RetryPolicy:
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_BUDGET = 50
+    DEFAULT_BASE_DELAY = 2
+    DEFAULT_MAX_DELAY = 60
+
+    # upper bound on how long we will honor a Retry-After for
+    MAX_RETRY_AFTER = 300
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, budget=DEFAULT_BUDGET,
+                 base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.max_retries = max_retries
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    # whether the request that has failed `attempt` times can be retried.
+    # Takes from the run budget if so
+    def can_retry(self, attempt):
+        if attempt >= self.max_retries:
+            return False
+
+        with self.lock:
+            if self.retries >= self.budget:
+                return False
+
+            self.retries += 1
+            return True
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.MAX_RETRY_AFTER)
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    # parse a Retry-After header, which can be either a number of seconds or an
+    # HTTP date. Returns None if it is missing or can't be parsed
+    @staticmethod
+    def parse_retry_after(value):
+        if not value:
+            return None
+
+        value = value.strip()
+
+        if value.isdigit():
+            return int(value)
+
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+
+        return max(0, (date - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+
+from atomic_file import AtomicFile
+
+# Full text index over all of the editions in the output directory, searched
+# by search.html in the browser.
+#
+# Terms are hashed into a fixed number of shards, so a query only needs to
+# load the shards for the terms it contains. Shards are split into yearly
+# segments, so adding an edition only rewrites the shards for its year
+# rather than the whole index. Within a shard, postings are grouped by
+# edition, so an edition can be replaced without re-tokenizing the rest of
+# its year. Shards and doc lists are written as
+# .js files which call into the search page, so they can be loaded with
+# <script> tags when the page is opened from file:// (where fetch() isn't
+# allowed).
+#
+# The tokenizer and shard hash must match the ones in templates/search.html
+class SearchIndex:
+    DIR_NAME = "search"
+    VERSION = 2
+    SHARD_COUNT = 256
+
+    # relative weight of each part of an article when scoring matches
+    TITLE_WEIGHT = 5
+    SUBTITLE_WEIGHT = 3
+    BLURB_WEIGHT = 2
+    SUMMARY_WEIGHT = 2
+    CONTENT_WEIGHT = 1
+
+    STOP_WORDS = frozenset("""
+        a an and are as at be but by for from has have he her his in is it
+        its of on or that the their there they this to was were which will
+        with
+    """.split())
+
+    TAG_REGEX = re.compile(r'<[^>]+>')
+    TOKEN_REGEX = re.compile(r'[^\W_]+')
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.dir = os.path.join(root_dir, self.DIR_NAME)
+        self.editions = None
+
+    # split text into lower case index terms
+    @classmethod
+    def tokenize(cls, text):
+        text = cls.TAG_REGEX.sub(" ", text).lower()
+        return [
+            t for t in cls.TOKEN_REGEX.findall(text)
+            if len(t) > 1 and t not in cls.STOP_WORDS
+        ]
+
+    # 32 bit FNV-1a over the code points of the term
+    @classmethod
+    def shard_for(cls, term):
+        h = 0x811c9dc5
+        for c in term:
+            h ^= ord(c)
+            h = (h * 0x01000193) & 0xffffffff
+        return h % cls.SHARD_COUNT
+
+    # update the index with the articles for an edition, replacing anything
+    # previously indexed for it. url_prefix is the path of the edition
+    # directory, relative to the root of the output directory. Returns False
+    # if the edition was already indexed with the same articles
+    def add_edition(self, edition, articles, url_prefix):
+        docs = []
+        terms = {}
+
+        for article in articles:
+            doc_id = len(docs)
+            docs.append([
+                article.title,
+                f"{url_prefix}/{article.dir}/{article.file_name}",
+                article.subtitle or "",
+            ])
+
+            weights = {}
+            self._add_terms(weights, article.title, self.TITLE_WEIGHT)
+            self._add_terms(weights, article.subtitle, self.SUBTITLE_WEIGHT)
+            self._add_terms(weights, article.section_blurb, self.BLURB_WEIGHT)
+
+            for s in article.summary or []:
+                self._add_terms(weights, s, self.SUMMARY_WEIGHT)
+            self._add_terms(weights, article.relevance, self.SUMMARY_WEIGHT)
+
+            for c in article.content:
+                self._add_terms(weights, c, self.CONTENT_WEIGHT)
+
+            for term, weight in weights.items():
+                terms.setdefault(term, []).extend((doc_id, weight))
+
+        digest = hashlib.sha256(
+            json.dumps([docs, terms], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        editions = self._load_editions()
+        if editions.get(edition, [None, None])[1] == digest:
+            return False
+
+        self._update_shards(self.segment_for(edition), {edition}, {edition: terms})
+
+        self._write_js(
+            os.path.join("docs", f"{edition}.js"),
+            f"digestSearch.addDocs({json.dumps(edition)}, {self._dumps(docs)});\n"
+        )
+
+        editions[edition] = [len(docs), digest]
+        self._save_editions()
+        return True
+
+    # remove editions that are no longer in the output directory. Returns
+    # the list of removed editions
+    def prune(self, existing):
+        editions = self._load_editions()
+        removed = [e for e in editions if e not in existing]
+
+        if not removed:
+            return removed
+
+        for segment in {self.segment_for(e) for e in removed}:
+            self._update_shards(segment, set(removed), {})
+
+        for edition in removed:
+            del editions[edition]
+
+            path = os.path.join(self.dir, "docs", f"{edition}.js")
+            if os.path.exists(path):
+                os.remove(path)
+
+        self._save_editions()
+        return removed
+
+    def _add_terms(self, weights, text, weight):
+        if not text:
+            return
+
+        for term in self.tokenize(text):
+            weights[term] = weights.get(term, 0) + weight
+
+    # editions are named by their date, so segments are the year
+    @classmethod
+    def segment_for(cls, edition):
+        return edition[:4]
+
+    # remove the postings for the replaced editions from every shard in the
+    # segment, and add the new postings (term -> [doc, weight, ...]) for each
+    # edition
+    def _update_shards(self, segment, replaced, edition_terms):
+        added = {}
+        for edition, terms in edition_terms.items():
+            for term, postings in terms.items():
+                shard = self.shard_for(term)
+                added.setdefault(shard, {}).setdefault(term, {})[edition] = postings
+
+        for shard in range(self.SHARD_COUNT):
+            name = f"{segment}/{shard:02x}"
+            data = self._read_js(os.path.join("shards", f"{name}.js"))
+
+            if data is None and shard not in added:
+                continue
+
+            data = data or {}
+            changed = False
+
+            for term in list(data):
+                postings = data[term]
+                for edition in replaced.intersection(postings):
+                    del postings[edition]
+                    changed = True
+
+                if not postings:
+                    del data[term]
+
+            for term, postings in added.get(shard, {}).items():
+                data.setdefault(term, {}).update(postings)
+                changed = True
+
+            if changed:
+                self._write_js(
+                    os.path.join("shards", f"{name}.js"),
+                    f"digestSearch.addShard({json.dumps(name)}, {self._dumps(data)});\n"
+                )
+
+    def _load_editions(self):
+        if self.editions is None:
+            data = self._read_js("editions.js")
+
+            if data is None or data.get("version") != self.VERSION:
+                data = {"version": self.VERSION, "editions": {}}
+
+            self.editions = data["editions"]
+
+        return self.editions
+
+    def _save_editions(self):
+        data = {"version": self.VERSION, "editions": self.editions}
+        self._write_js("editions.js", f"digestSearch.addEditions({self._dumps(data)});\n")
+
+    def _dumps(self, data):
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    # read back the data from a .js file written by _write_js
+    def _read_js(self, rel_path):
+        try:
+            with open(os.path.join(self.dir, rel_path), "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+
+        # digestSearch.<function>(["name", ]<json>);
+        start = text.find("{")
+        end = text.rfind("}")
+
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+
+    def _write_js(self, rel_path, text):
+        path = os.path.join(self.dir, rel_path)
+        dir_path = os.path.dirname(path)
+        os.makedirs(dir_path, exist_ok=True)
+
+        with AtomicFile(path, "w", encoding="utf-8") as f:
+            f.write(text)
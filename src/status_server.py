@@ -0,0 +1,53 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Small HTTP server that reports the status of a long running process as
+# JSON, for checking on --watch mode. It only listens on localhost by
+# default. get_status is called for each request, from the server's
+# threads, and returns a dict that can be serialized to JSON.
+class StatusServer:
+    PATHS = ("/", "/status")
+
+    def __init__(self, port, get_status, host="127.0.0.1"):
+        self.server = ThreadingHTTPServer((host, port), self._handler(get_status))
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/status"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="status-server", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @staticmethod
+    def _handler(get_status):
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] not in StatusServer.PATHS:
+                    self.send_error(404)
+                    return
+
+                body = json.dumps(get_status(), indent=2, default=str).encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            # requests aren't logged to the console
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from llm_backend import LLMBackend
+
+# Backend that doesn't use a server, for testing and load testing the
+# summary pipeline. It simulates the latency of a real server (time to
+# process the prompt, plus time to generate the response) and can be
+# configured to return errors or invalid JSON at a given rate.
+#
+# Responses are deterministic: whether a prompt fails, and how long it takes,
+# depends only on the prompt, the seed and the number of times the prompt
+# has been sent (so a retried prompt can succeed), and not on the order
+# prompts are sent in.
+class StubBackend(LLMBackend):
+    NAME = "Stub"
+
+    # settings that can be passed with --stub-options
+    OPTIONS = {
+        "latency": 0.1,          # fixed seconds per request
+        "prompt_rate": 2000.0,   # prompt tokens processed per second (0 is instant)
+        "eval_rate": 50.0,       # response tokens generated per second (0 is instant)
+        "jitter": 0.1,           # random variation in latency (0.1 is +/- 10%)
+        "error_rate": 0.0,       # fraction of requests returning a server error
+        "invalid_rate": 0.0,     # fraction of requests returning invalid JSON
+        "seed": 0,
+    }
+
+    def __init__(self, options=None, **kwargs):
+        super().__init__(**kwargs)
+
+        unknown = set(options or {}) - set(self.OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown stub options : {', '.join(sorted(unknown))}")
+
+        self.options = {**self.OPTIONS, **(options or {})}
+
+        # number of times each prompt has been sent
+        self.sent = {}
+        self.lock = threading.Lock()
+
+    # parse options in the form latency=2,error_rate=0.1
+    @classmethod
+    def parse_options(cls, text):
+        options = {}
+
+        for item in filter(None, (i.strip() for i in text.split(","))):
+            name, sep, value = item.partition("=")
+            if not sep:
+                raise ValueError(f"Invalid stub option : {item}")
+
+            name = name.strip()
+            if name not in cls.OPTIONS:
+                raise ValueError(f"Unknown stub option : {name}")
+
+            options[name] = float(value)
+
+        return options
+
+    def prompt(self, prompt):
+        o = self.options
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+        with self.lock:
+            attempt = self.sent.get(prompt_hash, 0)
+            self.sent[prompt_hash] = attempt + 1
+
+        rng = random.Random(f"{o['seed']}:{prompt_hash}:{attempt}")
+
+        content = json.dumps({
+            "summary": [
+                f"Stub summary point {i} ({rng.randrange(1000)})."
+                for i in range(1, 4)
+            ],
+            "relevance": "Stub summary of why the article is important."
+        })
+
+        prompt_tokens = len(prompt) // 4
+        eval_tokens = len(content) // 4
+
+        jitter = 1 + rng.uniform(-o["jitter"], o["jitter"])
+        prompt_seconds = prompt_tokens / o["prompt_rate"] * jitter if o["prompt_rate"] else 0
+        eval_seconds = eval_tokens / o["eval_rate"] * jitter if o["eval_rate"] else 0
+
+        time.sleep(o["latency"] * jitter + prompt_seconds + eval_seconds)
+
+        outcome = rng.random()
+
+        if outcome < o["error_rate"]:
+            return {"error": "stub server error"}
+
+        if outcome < o["error_rate"] + o["invalid_rate"]:
+            content = "The summary is: " + content[:len(content) // 2]
+
+        return {
+            "model": self.llm,
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": eval_tokens,
+            "eval_duration": int(eval_seconds * 1e9),
+        }
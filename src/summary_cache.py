@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache of LLM generated summaries, stored in a SQLite database.
+# Entries are keyed by a hash of the article content and everything that
+# affects the generated summary (backend, model, context size and prompt
+# version), so re-running an edition doesn't send unchanged articles to the
+# LLM again.
+class SummaryCache:
+    DB_FILE = "summaries.sqlite"
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, self.DB_FILE)
+
+        # connection is shared between the summary worker threads, and
+        # access is serialized with the lock
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self.db.commit()
+
+    @staticmethod
+    def make_key(content, backend, llm, num_ctx, prompt_version):
+        h = hashlib.sha256()
+
+        for part in (backend, llm, str(num_ctx), str(prompt_version), content):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+
+        return h.hexdigest()
+
+    # returns the cached summary dict, or None if there isn't one
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            self.db.execute(
+                "UPDATE summaries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.db.commit()
+
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        data = json.dumps(value)
+
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO summaries (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time()),
+            )
+            self.evict()
+            self.db.commit()
+
+    # remove the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM summaries").fetchone()[0]
+
+        if total <= self.max_bytes:
+            return
+
+        rows = self.db.execute(
+            "SELECT key, size FROM summaries ORDER BY last_used ASC"
+        ).fetchall()
+
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+
+            self.db.execute("DELETE FROM summaries WHERE key = ?", (key,))
+            total -= size
+
+    def close(self):
+        with self.lock:
+            self.db.close()
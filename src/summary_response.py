@@ -0,0 +1,138 @@
+import ast
+import json
+import re
+
+# Parsing and validation of the JSON summaries returned by the LLM.
+#
+# Models frequently return JSON that is almost valid: wrapped in markdown
+# code fences, using single quotes, with trailing commas, or cut off before
+# the closing brackets. These are repaired locally where possible, so the
+# summary doesn't need to be generated again.
+
+FENCE_REGEX = re.compile(r'^```[a-zA-Z]*\s*|\s*```$')
+TRAILING_COMMA_REGEX = re.compile(r',\s*([}\]])')
+
+# curly quotes used in place of the JSON delimiters, around keys and values.
+# Curly quotes inside a string are left alone
+SMART_QUOTES = {"“": '"', "”": '"', "‘": "'", "’": "'"}
+OPEN_QUOTE_REGEX = re.compile(r'(^|[{\[,:])(\s*)([“”‘’])')
+CLOSE_QUOTE_REGEX = re.compile(r'([“”‘’])(\s*(?:[:,\]}]|$))')
+
+class InvalidSummary(ValueError):
+    pass
+
+# parse and validate the response text. Returns a tuple of the summary
+# ({"summary": [...], "relevance": "..."}) and whether it had to be repaired.
+# Raises InvalidSummary if it can't be parsed
+def parse_summary(text):
+    if not isinstance(text, str) or not text.strip():
+        raise InvalidSummary("response is empty")
+
+    try:
+        return validate_summary(json.loads(text)), False
+    except (ValueError, InvalidSummary):
+        pass
+
+    data = repair_json(text)
+    return validate_summary(data), True
+
+# check that the parsed response has the expected fields, and normalize it
+def validate_summary(data):
+    if not isinstance(data, dict):
+        raise InvalidSummary("response is not a JSON object")
+
+    # models sometimes capitalize the keys
+    data = {str(k).strip().lower(): v for k, v in data.items()}
+
+    if "summary" not in data:
+        raise InvalidSummary("response is missing 'summary'")
+
+    if "relevance" not in data:
+        raise InvalidSummary("response is missing 'relevance'")
+
+    summary = data["summary"]
+    if isinstance(summary, str):
+        summary = [summary]
+
+    if not isinstance(summary, list):
+        raise InvalidSummary("'summary' is not a list")
+
+    summary = [s.strip() for s in summary if isinstance(s, str) and s.strip()]
+    if not summary:
+        raise InvalidSummary("'summary' has no points")
+
+    relevance = data["relevance"]
+    if isinstance(relevance, list):
+        relevance = " ".join(r for r in relevance if isinstance(r, str))
+
+    if not isinstance(relevance, str) or not relevance.strip():
+        raise InvalidSummary("'relevance' is empty")
+
+    return {"summary": summary, "relevance": relevance.strip()}
+
+# attempt to fix common problems with JSON returned by the LLM. Returns the
+# parsed data, or raises InvalidSummary
+def repair_json(text):
+    text = FENCE_REGEX.sub("", text.strip())
+
+    start = text.find("{")
+    if start == -1:
+        raise InvalidSummary("response does not contain a JSON object")
+
+    end = text.rfind("}")
+    text = text[start:end + 1] if end > start else text[start:]
+
+    try:
+        return parse_repaired(text)
+    except InvalidSummary:
+        pass
+
+    # curly quotes used as delimiters. Only tried if the text can't be
+    # parsed as it is, as it can change quotes inside a string
+    return parse_repaired(replace_smart_quotes(text))
+
+def parse_repaired(text):
+    text = TRAILING_COMMA_REGEX.sub(r'\1', close_brackets(text))
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    # python style literals, such as single quoted strings
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+
+    raise InvalidSummary("response is not valid JSON")
+
+def replace_smart_quotes(text):
+    text = OPEN_QUOTE_REGEX.sub(lambda m: m.group(1) + m.group(2) + SMART_QUOTES[m.group(3)], text)
+    return CLOSE_QUOTE_REGEX.sub(lambda m: SMART_QUOTES[m.group(1)] + m.group(2), text)
+
+# close any strings, arrays and objects left open by a truncated response
+def close_brackets(text):
+    stack = []
+    quote = None
+    escaped = False
+
+    for c in text:
+        if quote:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack and stack[-1] == c:
+            stack.pop()
+
+    if quote:
+        text += quote
+
+    return text + "".join(reversed(stack))
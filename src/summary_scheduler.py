@@ -0,0 +1,80 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Runs summary jobs on a pool of worker threads, in priority order rather
+# than the order they were submitted. Jobs are ordered by priority (lower
+# runs first), and then by size, so within a priority the shortest articles
+# are summarized first.
+#
+# An optional time budget can be set. Once it has expired, expired() returns
+# True so jobs can skip any work that would need the LLM.
+class SummaryScheduler:
+
+    def __init__(self, workers):
+        self.queue = queue.PriorityQueue()
+        self.counter = itertools.count()
+        self.deadline = None
+
+        self.threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name=f"summary-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    # start the time budget, in seconds. None or 0 removes the budget
+    def set_budget(self, seconds):
+        self.deadline = time.monotonic() + seconds if seconds else None
+
+    def expired(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    # queue fn(*args) to be run. Returns a Future for the result
+    def submit(self, priority, size, fn, *args):
+        future = Future()
+
+        # the counter keeps jobs with the same priority and size in the
+        # order they were submitted, and means futures are never compared
+        self.queue.put(((priority, size, next(self.counter)), future, fn, args))
+        return future
+
+    # stop the workers once the queued jobs have run, or cancel the queued
+    # jobs if cancel_futures is True
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            while True:
+                try:
+                    _, future, _, _ = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+                if future:
+                    future.cancel()
+
+        # sort after any remaining jobs
+        for _ in self.threads:
+            self.queue.put(((float("inf"), 0, next(self.counter)), None, None, None))
+
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            _, future, fn, args = self.queue.get()
+
+            if future is None:
+                return
+
+            # the job was cancelled while it was queued
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)